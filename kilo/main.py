@@ -1,18 +1,86 @@
 import os
-from fastapi import FastAPI, HTTPException
+import httpx
+from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from openai import OpenAI
+from fastapi.responses import StreamingResponse, ORJSONResponse
+from pydantic import BaseModel, Field
+from openai import AsyncOpenAI
 from typing import Optional
-import json
+from contextlib import asynccontextmanager
+import orjson
+import time
+import hashlib
 from datetime import datetime
 
 # Environment variables
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# One shared client so TLS connections to api.openai.com are kept alive across requests.
+# No automatic retries: a timed-out completion would be re-sent (and billed) again while
+# the user waits. The 30 s read timeout is the max gap between chunks on /chat/stream;
+# non-streaming /chat waits for the whole reply, so it passes CHAT_TIMEOUT per call.
+CHAT_TIMEOUT = httpx.Timeout(120.0, connect=5.0)
 
-app = FastAPI(title="KILO - Shopify AI Employee")
+openai_client = AsyncOpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    max_retries=0,
+    http_client=httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        timeout=httpx.Timeout(30.0, connect=5.0)
+    )
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await openai_client.close()
+
+app = FastAPI(title="KILO - Shopify AI Employee", default_response_class=ORJSONResponse, lifespan=lifespan)
+
+# Reject oversized bodies before they are read into memory. Plain ASGI (not
+# BaseHTTPMiddleware) so chunked bodies without Content-Length are capped too
+MESSAGE_MAX_CHARS = 4000
+SESSION_ID_MAX_CHARS = 128
+# Derived from the ChatMessage limits so the byte cap never rejects a schema-valid
+# body: JSON clients may escape every char as \uXXXX (6 bytes, 12 for an emoji
+# surrogate pair), plus 1 KiB for keys, whitespace and framing
+MAX_BODY_BYTES = (MESSAGE_MAX_CHARS + SESSION_ID_MAX_CHARS) * 12 + 1024
+
+class BodySizeLimitMiddleware:
+    def __init__(self, app, max_body_bytes: int):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Fast path: refuse on the declared size without reading anything
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None:
+            if not content_length.isdigit():
+                await ORJSONResponse({"detail": "Invalid Content-Length"}, status_code=400)(scope, receive, send)
+                return
+            if int(content_length) > self.max_body_bytes:
+                await ORJSONResponse({"detail": "Request body too large"}, status_code=413)(scope, receive, send)
+                return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    # Raised inside the route's body read, so FastAPI turns it into a 413
+                    raise HTTPException(status_code=413, detail="Request body too large")
+            return message
 
-# CORS
+        await self.app(scope, limited_receive, send)
+
+app.add_middleware(BodySizeLimitMiddleware, max_body_bytes=MAX_BODY_BYTES)
+
+# CORS (registered last so it stays outermost and error responses keep CORS headers)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -23,8 +91,74 @@ app.add_middleware(
 
 # Models
 class ChatMessage(BaseModel):
-    message: str
-    session_id: Optional[str] = "default"
+    message: str = Field(..., max_length=MESSAGE_MAX_CHARS)
+    session_id: Optional[str] = Field("default", max_length=SESSION_ID_MAX_CHARS)
+
+FALLBACK_RESPONSE = "KILO here - having a quick technical moment. Try that again? I'm here to help with anything Tahoe Enterprise related!"
+
+SYSTEM_PROMPT = "You are KILO, an AI employee for Tahoe Enterprise founded by Ponch. You help with our streetwear clothing brand, B2B business services, and VIP custom work. Be helpful, authentic, and ready to execute for customers. Speak like a real person, not corporate."
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+
+def build_messages(message: str):
+    return [SYSTEM_MESSAGE, {"role": "user", "content": message}]
+
+def sse(payload, event=None) -> bytes:
+    frame = b"data: " + orjson.dumps(payload) + b"\n\n"
+    return b"event: " + event.encode() + b"\n" + frame if event else frame
+
+# Rate limiting + response cache (in-process, per worker)
+# Per worker, not per deployment: each uvicorn worker keeps its own window, so an IP
+# can get up to WEB_CONCURRENCY times this many requests a minute depending on how
+# connections land (10-20 with the default 2 workers in the Procfile/railway.json)
+RATE_LIMIT_PER_MINUTE_PER_WORKER = int(os.getenv("KILO_RATE_LIMIT_PER_MINUTE_PER_WORKER", "10"))
+RESPONSE_CACHE_TTL = int(os.getenv("KILO_RESPONSE_CACHE_TTL", "60"))
+RESPONSE_CACHE_MAX_SIZE = 1024
+
+_rate_window = {"minute": 0, "counts": {}}
+_response_cache = {}
+
+# Number of proxies in front of the app that append to X-Forwarded-For (Railway's edge = 1)
+TRUSTED_PROXY_HOPS = int(os.getenv("KILO_TRUSTED_PROXY_HOPS", "1"))
+
+def client_ip(request: Request) -> str:
+    # Entries left of the ones our proxies appended are client-supplied and can be spoofed
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded and TRUSTED_PROXY_HOPS > 0:
+        hops = [hop.strip() for hop in forwarded.split(",")]
+        return hops[-min(TRUSTED_PROXY_HOPS, len(hops))]
+    return request.client.host if request.client else "unknown"
+
+async def rate_limit(request: Request):
+    minute = int(time.time() // 60)
+    if _rate_window["minute"] != minute:
+        _rate_window["minute"] = minute
+        _rate_window["counts"] = {}
+
+    counts = _rate_window["counts"]
+    ip = client_ip(request)
+    counts[ip] = counts.get(ip, 0) + 1
+    if counts[ip] > RATE_LIMIT_PER_MINUTE_PER_WORKER:
+        raise HTTPException(status_code=429, detail="Too many messages - give KILO a minute and try again.")
+
+def response_cache_key(message: str) -> str:
+    return hashlib.sha1(message.strip().lower().encode()).hexdigest()
+
+def get_cached_response(message: str) -> Optional[str]:
+    key = response_cache_key(message)
+    entry = _response_cache.get(key)
+    if entry is None:
+        return None
+    expires_at, response = entry
+    if expires_at < time.monotonic():
+        del _response_cache[key]
+        return None
+    return response
+
+def cache_response(message: str, response: str):
+    if len(_response_cache) >= RESPONSE_CACHE_MAX_SIZE:
+        # Dicts keep insertion order, so this drops the oldest entry
+        del _response_cache[next(iter(_response_cache))]
+    _response_cache[response_cache_key(message)] = (time.monotonic() + RESPONSE_CACHE_TTL, response)
 
 @app.get("/")
 async def root():
@@ -41,24 +175,33 @@ async def health_check():
     return {
         "status": "KILO online",
         "version": "1.0",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": datetime.now().isoformat(timespec="seconds")
     }
 
-@app.post("/chat")
+@app.post("/chat", dependencies=[Depends(rate_limit)])
 async def chat_with_kilo(chat_data: ChatMessage):
+    cached = get_cached_response(chat_data.message)
+    if cached is not None:
+        return {
+            "response": cached,
+            "session_id": chat_data.session_id,
+            "status": "success",
+            "agent": "KILO"
+        }
+
     try:
-        response = openai_client.chat.completions.create(
+        response = await openai_client.chat.completions.create(
             model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are KILO, an AI employee for Tahoe Enterprise founded by Ponch. You help with our streetwear clothing brand, B2B business services, and VIP custom work. Be helpful, authentic, and ready to execute for customers. Speak like a real person, not corporate."},
-                {"role": "user", "content": chat_data.message}
-            ],
+            messages=build_messages(chat_data.message),
             max_tokens=500,
-            temperature=0.7
+            temperature=0.7,
+            timeout=CHAT_TIMEOUT
         )
+        content = response.choices[0].message.content
+        cache_response(chat_data.message, content)
         
         return {
-            "response": response.choices[0].message.content,
+            "response": content,
             "session_id": chat_data.session_id,
             "status": "success",
             "agent": "KILO"
@@ -66,12 +209,59 @@ async def chat_with_kilo(chat_data: ChatMessage):
         
     except Exception as e:
         return {
-            "response": "KILO here - having a quick technical moment. Try that again? I'm here to help with anything Tahoe Enterprise related!",
+            "response": FALLBACK_RESPONSE,
             "session_id": chat_data.session_id,
             "status": "fallback",
             "error": str(e)
         }
 
+@app.post("/chat/stream", dependencies=[Depends(rate_limit)])
+async def stream_chat_with_kilo(chat_data: ChatMessage):
+    # Server-sent events: one "data:" frame per token chunk, an "error" event if
+    # OpenAI fails, then a "done" event
+    async def event_stream():
+        streamed = False
+        try:
+            stream = await openai_client.chat.completions.create(
+                model="gpt-4",
+                messages=build_messages(chat_data.message),
+                max_tokens=500,
+                temperature=0.7,
+                stream=True
+            )
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    streamed = True
+                    yield sse({"delta": delta})
+            status = "success"
+        except Exception as e:
+            # Only fall back to the canned reply if nothing was shown yet, so it
+            # never gets glued onto a partial answer
+            if not streamed:
+                yield sse({"delta": FALLBACK_RESPONSE})
+            yield sse({"error": str(e)}, event="error")
+            status = "fallback"
+
+        done = {"session_id": chat_data.session_id, "status": status, "agent": "KILO"}
+        yield sse(done, event="done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Each worker has its own OpenAI pool, rate-limit window (limit is per worker) and response cache
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", "8000")),
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+    )